@@ -1,6 +1,7 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 import uvicorn
 import logging
 from typing import Dict, Any, Optional
@@ -71,17 +72,22 @@ def read_root():
 async def upload_file(file: UploadFile = File(...)):
     """Upload and process file"""
     try:
-        # Check file size (limit to 50MB)
-        MAX_SIZE = 50 * 1024 * 1024  # 50MB
+        # Check file size against the same limit file_handler validates with
         file_size = 0
-        contents = b''
+        chunks = []
         
         # Read file in chunks to avoid memory issues
         while chunk := await file.read(1024 * 1024):  # Read 1MB at a time
-            contents += chunk
+            chunks.append(chunk)
             file_size += len(chunk)
-            if file_size > MAX_SIZE:
-                raise HTTPException(status_code=413, detail="File too large (max 50MB)")
+            if file_size > Config.MAX_FILE_SIZE_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large (max {Config.MAX_FILE_SIZE_MB}MB)"
+                )
+        
+        # Join once; repeated bytes concatenation would copy the buffer per chunk
+        contents = b''.join(chunks)
         
         # Get file extension
         file_ext = file.filename.split(".")[-1].lower() if "." in file.filename else ""
@@ -96,11 +102,11 @@ async def upload_file(file: UploadFile = File(...)):
         
         # Process file contents based on file type
         # We're using your existing file_handler for actual processing
-        file_metadata = file_handler.process_uploaded_file(
-            filename=file.filename,
-            content=contents,
-            file_type=file_ext
-        )
+        # Parsing is blocking CPU work, so keep it off the event loop
+        file_info = await run_in_threadpool(file_handler.process_file_bytes, file.filename, contents)
+        if "error" in file_info:
+            raise HTTPException(status_code=400, detail=file_info["error"])
+        file_metadata = file_info["metadata"]
         
         # Return metadata that matches the frontend's expected structure
         return {
@@ -109,9 +115,9 @@ async def upload_file(file: UploadFile = File(...)):
                 "filename": file.filename,
                 "file_size_bytes": file_size,
                 "file_extension": file_ext,
-                "estimated_pages": file_metadata.get("page_count", 1),
-                "estimated_reading_time": file_metadata.get("reading_time", "1 min"),
-                "processing_complexity": file_metadata.get("complexity", "medium")
+                "estimated_pages": file_metadata.get("estimated_pages", 1),
+                "estimated_reading_time": file_metadata.get("estimated_reading_time", "1 min"),
+                "processing_complexity": file_metadata.get("processing_complexity", "medium")
             }
         }
         
@@ -253,10 +259,13 @@ async def check_progress(job_id: str):
     
     # Clean up old jobs (production would use a better solution)
     current_time = time.time()
-    for jid in list(processing_jobs.keys()):
-        if current_time - processing_jobs[jid]["created"] > 3600:  # 1 hour
-            if processing_jobs[jid]["status"] != "processing":
-                del processing_jobs[jid]
+    expired_jobs = [
+        jid for jid, stored_job in processing_jobs.items()
+        if current_time - stored_job["created"] > 3600  # 1 hour
+        and stored_job["status"] != "processing"
+    ]
+    for jid in expired_jobs:
+        del processing_jobs[jid]
     
     # Return job status
     response = {
@@ -2,7 +2,6 @@ import logging
 import time
 from typing import Dict, Optional, Callable, Any
 from dataclasses import dataclass
-from datetime import datetime
 
 from azure.ai.documentintelligence import DocumentIntelligenceClient
 from azure.core.credentials import AzureKeyCredential
@@ -71,7 +70,7 @@ class EnhancedAzureDocumentProcessor:
             
             # Simple health check - just test client creation
             self.is_healthy = True
-            self.last_health_check = datetime.now()
+            self.last_health_check = time.monotonic()
             logger.debug("Azure Document Intelligence health check passed")
             return True
             
@@ -85,7 +84,7 @@ class EnhancedAzureDocumentProcessor:
         """Check if Azure Document Intelligence is available and healthy"""
         # Re-check health if it's been more than 5 minutes
         if (self.last_health_check and 
-            (datetime.now() - self.last_health_check).seconds > 300):
+            time.monotonic() - self.last_health_check > 300):
             self._perform_health_check()
         
         return self.is_healthy
@@ -1,8 +1,8 @@
 import logging
+import re
 import time
 from typing import Dict, List, Optional, Callable, Any
 from dataclasses import dataclass
-from datetime import datetime
 
 from azure.core.credentials import AzureKeyCredential
 from azure.ai.textanalytics import TextAnalyticsClient
@@ -13,6 +13,9 @@ from fallbacks import simple_key_extraction, simple_extractive_summary
 
 logger = logging.getLogger(__name__)
 
+# Sentence terminators, matching the '!'/'?' -> '.' normalisation used elsewhere
+_SENTENCE_END_RE = re.compile(r'[.!?]')
+
 @dataclass
 class AzureProcessingLimits:
     """Centralized Azure API limits - prevents hardcoded magic numbers"""
@@ -74,7 +77,7 @@ class AzureLanguageProcessor:
             
             if test_result and not test_result[0].is_error:
                 self.is_healthy = True
-                self.last_health_check = datetime.now()
+                self.last_health_check = time.monotonic()
                 logger.debug("Azure Language Services health check passed")
                 return True
             
@@ -87,7 +90,7 @@ class AzureLanguageProcessor:
     def is_available(self) -> bool:
         """Check if Azure Language Services is available and healthy"""
         if (self.last_health_check and 
-            (datetime.now() - self.last_health_check).seconds > 300):
+            time.monotonic() - self.last_health_check > 300):
             self._perform_health_check()
         
         return self.is_healthy
@@ -109,12 +112,14 @@ class AzureLanguageProcessor:
             if progress_callback:
                 progress_callback("📝 Extracting key phrases...")
             
-            key_phrases = self._extract_key_phrases_robust(text)
+            # Both Azure passes work on the same chunks, so split the text once
+            chunks = self._smart_text_splitting(text, AzureProcessingLimits.CHUNK_SIZE_MAX)
+            key_phrases = self._extract_key_phrases_robust(text, chunks)
             
             if progress_callback:
                 progress_callback("📄 Creating intelligent summaries...")
             
-            summaries = self._create_study_summaries_robust(text, key_phrases)
+            summaries = self._create_study_summaries_robust(text, key_phrases, chunks)
             
             if progress_callback:
                 progress_callback("📊 Analyzing text complexity...")
@@ -148,14 +153,15 @@ class AzureLanguageProcessor:
             self.metrics.error_count += 1
             return self._create_fallback_analysis(text)
     
-    def _extract_key_phrases_robust(self, text: str) -> List[str]:
+    def _extract_key_phrases_robust(self, text: str, chunks: Optional[List[str]] = None) -> List[str]:
         """Extract key phrases with retry logic and batching"""
         if not self.client or not self.is_healthy:
             logger.warning("Azure client unavailable for key phrase extraction")
             return simple_key_extraction(text)
         
         try:
-            chunks = self._smart_text_splitting(text, AzureProcessingLimits.CHUNK_SIZE_MAX)
+            if chunks is None:
+                chunks = self._smart_text_splitting(text, AzureProcessingLimits.CHUNK_SIZE_MAX)
             all_phrases = []
             
             for chunk in chunks:
@@ -227,12 +233,13 @@ class AzureLanguageProcessor:
         
         return chunks
     
-    def _create_study_summaries_robust(self, text: str, key_phrases: List[str]) -> Dict[str, str]:
+    def _create_study_summaries_robust(self, text: str, key_phrases: List[str],
+                                       chunks: Optional[List[str]] = None) -> Dict[str, str]:
         """Create multiple summary types with robust error handling"""
         
         summaries = {}
         
-        summaries['extractive'] = self._get_azure_extractive_summary(text)
+        summaries['extractive'] = self._get_azure_extractive_summary(text, chunks)
         summaries['best'] = self._create_intelligent_summary(text, key_phrases)
         summaries['abstractive'] = self._create_conceptual_summary(text, key_phrases)
         
@@ -241,14 +248,15 @@ class AzureLanguageProcessor:
         
         return summaries
     
-    def _get_azure_extractive_summary(self, text: str) -> str:
+    def _get_azure_extractive_summary(self, text: str, chunks: Optional[List[str]] = None) -> str:
         """Get extractive summary using Azure with fallback"""
         
         if not self.client or not self.is_healthy:
             return simple_extractive_summary(text)
         
         try:
-            chunks = self._smart_text_splitting(text, AzureProcessingLimits.CHUNK_SIZE_MAX)
+            if chunks is None:
+                chunks = self._smart_text_splitting(text, AzureProcessingLimits.CHUNK_SIZE_MAX)
             summaries = []
             
             for chunk in chunks:
@@ -339,15 +347,15 @@ class AzureLanguageProcessor:
     
     def _analyze_text_complexity(self, text: str) -> Dict[str, Any]:
         """Enhanced text analysis with study metrics"""
-        words = text.split()
-        sentences = text.replace('!', '.').replace('?', '.').split('.')
-        sentences = [s for s in sentences if len(s.strip()) > 10]
+        word_count = len(text.split())
+        # Count sentences lazily instead of building the list of them
+        sentence_count = sum(1 for s in _SENTENCE_END_RE.split(text) if len(s.strip()) > 10)
         
         return {
-            'word_count': len(words),
-            'sentence_count': len(sentences),
-            'avg_sentence_length': len(words) / max(len(sentences), 1),
-            'estimated_reading_time': len(words) / 200  # minutes at 200 WPM
+            'word_count': word_count,
+            'sentence_count': sentence_count,
+            'avg_sentence_length': word_count / max(sentence_count, 1),
+            'estimated_reading_time': word_count / 200  # minutes at 200 WPM
         }
     
     def _assess_study_quality(self, text: str, key_phrases: List[str]) -> Dict[str, Any]:
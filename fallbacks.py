@@ -6,6 +6,25 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Bound once at import so the per-document fallbacks skip repeated Config lookups
+_MAX_KEY_PHRASES = Config.MAX_KEY_PHRASES
+_DEFAULT_FLASHCARD_COUNT = Config.DEFAULT_FLASHCARD_COUNT
+
+# Enhanced stop words list for better filtering
+_STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
+    'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 
+    'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that',
+    'these', 'those', 'it', 'they', 'them', 'their', 'there', 'then', 'than', 'when', 'where',
+    'why', 'how', 'what', 'who', 'which', 'said', 'say', 'says', 'get', 'got', 'go', 'goes',
+    'went', 'come', 'came', 'see', 'saw', 'know', 'knew', 'think', 'thought', 'take', 'took',
+    'make', 'made', 'give', 'gave', 'find', 'found', 'use', 'used', 'work', 'works', 'worked'
+})
+
+_NON_WORD_RE = re.compile(r'[^\w]')
+_HAS_LETTER_RE = re.compile(r'[a-zA-Z]')
+_PUNCT_STR = '.,!?;:"()[]'
+
 def simple_key_extraction(text: str) -> List[str]:
     """Enhanced keyword extraction fallback with improved algorithm"""
     try:
@@ -18,36 +37,24 @@ def simple_key_extraction(text: str) -> List[str]:
         # Convert to lowercase and split
         words = text.lower().split()
         
-        # Enhanced stop words list for better filtering
-        stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
-            'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 
-            'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that',
-            'these', 'those', 'it', 'they', 'them', 'their', 'there', 'then', 'than', 'when', 'where',
-            'why', 'how', 'what', 'who', 'which', 'said', 'say', 'says', 'get', 'got', 'go', 'goes',
-            'went', 'come', 'came', 'see', 'saw', 'know', 'knew', 'think', 'thought', 'take', 'took',
-            'make', 'made', 'give', 'gave', 'find', 'found', 'use', 'used', 'work', 'works', 'worked'
-        }
-        
         # Clean and filter words
         cleaned_words = []
         for word in words:
-            # Remove punctuation and convert to lowercase
-            cleaned_word = re.sub(r'[^\w]', '', word).lower()
+            # Remove punctuation (text is already lowercased)
+            cleaned_word = _NON_WORD_RE.sub('', word)
             
             # Filter criteria: length > 3, not a stop word, contains letters
             if (len(cleaned_word) > 3 and 
-                cleaned_word not in stop_words and 
-                re.search(r'[a-zA-Z]', cleaned_word) and
+                cleaned_word not in _STOP_WORDS and 
+                _HAS_LETTER_RE.search(cleaned_word) and
                 not cleaned_word.isdigit()):
                 cleaned_words.append(cleaned_word)
         
         # Count word frequencies using Counter for better performance
         word_freq = Counter(cleaned_words)
         
-        # Get top words, using the correct config reference
-        max_phrases = Config.MAX_KEY_PHRASES
-        top_words = [word for word, freq in word_freq.most_common(max_phrases)]
+        # Get top words
+        top_words = [word for word, freq in word_freq.most_common(_MAX_KEY_PHRASES)]
         
         logger.info(f"Extracted {len(top_words)} key phrases using fallback method")
         return top_words
@@ -69,13 +76,20 @@ def simple_extractive_summary(text: str) -> str:
         sentences = re.split(r'[.!?]+', text)
         sentences = [s.strip() for s in sentences if len(s.strip()) > 15]  # Filter very short sentences
         
-        if len(sentences) <= 2:
-            # If very few sentences, return as-is
+        # Select sentences based on document length
+        if len(sentences) > 10:
+            num_sentences = 4
+        elif len(sentences) > 6:
+            num_sentences = 3
+        else:
+            num_sentences = 2
+        
+        if len(sentences) <= num_sentences:
+            # Nothing to choose between, so skip scoring and return as-is
             return ". ".join(sentences).strip() + "."
         
         # Score sentences based on multiple factors
         scored_sentences = []
-        total_words = len(text.split())
         
         for i, sentence in enumerate(sentences):
             score = 0
@@ -120,14 +134,6 @@ def simple_extractive_summary(text: str) -> str:
         # Sort by score (descending) and select top sentences
         scored_sentences.sort(key=lambda x: x[1], reverse=True)
         
-        # Select sentences based on document length
-        if len(sentences) > 10:
-            num_sentences = min(4, len(scored_sentences))
-        elif len(sentences) > 6:
-            num_sentences = min(3, len(scored_sentences))
-        else:
-            num_sentences = min(2, len(scored_sentences))
-        
         # Get top sentences and sort them back to original order
         selected_sentences = sorted(
             scored_sentences[:num_sentences], 
@@ -153,7 +159,7 @@ def create_basic_flashcards(text: str, num_cards: int = None) -> Dict:
     """Enhanced fallback flashcard creation with improved algorithms"""
     try:
         if num_cards is None:
-            num_cards = Config.DEFAULT_FLASHCARD_COUNT
+            num_cards = _DEFAULT_FLASHCARD_COUNT
         
         if not text or len(text.strip()) < 30:
             logger.warning("Text too short for flashcard generation")
@@ -169,29 +175,29 @@ def create_basic_flashcards(text: str, num_cards: int = None) -> Dict:
             return _create_emergency_flashcard(text)
         
         fallback_flashcards = []
-        used_concepts = set()  # Avoid duplicate concepts
+        used_concepts = set()  # Casefolded concept keys, to avoid duplicate concepts
+        sentence_words = {}  # Sentence index -> tokens, so each sentence is split once
         
         for i, sentence in enumerate(sentences[:num_cards * 2]):  # Process more sentences for better selection
             if len(fallback_flashcards) >= num_cards:
                 break
                 
-            card = _create_flashcard_from_sentence(sentence, i, used_concepts)
+            sentence_words[i] = sentence.split()
+            card = _create_flashcard_from_sentence(sentence, i, used_concepts, sentence_words[i])
             if card:
                 fallback_flashcards.append(card)
-                used_concepts.add(card['concept'])
+                used_concepts.add(card['concept'].casefold())
         
         # If we don't have enough cards, create additional ones with different strategies
         while len(fallback_flashcards) < min(num_cards, len(sentences)):
-            remaining_sentences = sentences[len(fallback_flashcards):]
-            if not remaining_sentences:
-                break
+            index = len(fallback_flashcards)
                 
             # Use definition-style questions for remaining sentences
-            sentence = remaining_sentences[0]
-            card = _create_definition_card(sentence, len(fallback_flashcards))
-            if card and card['concept'] not in used_concepts:
+            sentence = sentences[index]
+            card = _create_definition_card(sentence, index, sentence_words.get(index))
+            if card and card['concept'].casefold() not in used_concepts:
                 fallback_flashcards.append(card)
-                used_concepts.add(card['concept'])
+                used_concepts.add(card['concept'].casefold())
             else:
                 break
         
@@ -221,10 +227,12 @@ def create_basic_flashcards(text: str, num_cards: int = None) -> Dict:
         logger.error(f"Enhanced flashcard fallback failed: {e}")
         return _create_emergency_flashcard(text)
 
-def _create_flashcard_from_sentence(sentence: str, index: int, used_concepts: set) -> Dict:
+def _create_flashcard_from_sentence(sentence: str, index: int, used_concepts: set,
+                                    words: List[str] = None) -> Dict:
     """Create a flashcard from a single sentence using multiple strategies"""
     
-    words = sentence.split()
+    if words is None:
+        words = sentence.split()
     if len(words) < 4:
         return None
     
@@ -237,7 +245,7 @@ def _create_flashcard_from_sentence(sentence: str, index: int, used_concepts: se
     
     if capitalized_terms:
         term = capitalized_terms[0]
-        if term.lower() not in used_concepts:
+        if term.casefold() not in used_concepts:
             return {
                 'question': f"What is {term} according to this material?",
                 'answer': sentence.strip(),
@@ -262,7 +270,7 @@ def _create_flashcard_from_sentence(sentence: str, index: int, used_concepts: se
             definition = match.group(2).strip()
             
             if (len(term.split()) <= 4 and len(definition.split()) >= 3 and
-                term.lower() not in used_concepts):
+                term.casefold() not in used_concepts):
                 return {
                     'question': f"Define: {term}",
                     'answer': definition,
@@ -272,21 +280,25 @@ def _create_flashcard_from_sentence(sentence: str, index: int, used_concepts: se
                 }
     
     # Strategy 3: Fill-in-the-blank for important words
+    # Track each word's offset while scanning so the blank can be spliced in directly
     important_words = []
+    cursor = 0
     for word in words:
+        offset = sentence.find(word, cursor)
+        cursor = offset + len(word)
         if (len(word) > 5 and word.lower() not in ['because', 'through', 'however', 'therefore'] and
             not word.lower() in ['the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had', 'was', 'one']):
-            important_words.append(word)
+            important_words.append((word, offset))
     
     if important_words and len(words) > 8:
-        # Choose a word from the middle portion of the sentence
-        middle_words = important_words[len(important_words)//4:3*len(important_words)//4]
-        if middle_words:
-            blank_word = middle_words[0]
+        # Choose the first word of the middle portion of the sentence (no slice copy needed)
+        middle_start = len(important_words) // 4
+        if middle_start < 3 * len(important_words) // 4:
+            blank_word, blank_offset = important_words[middle_start]
             concept_name = blank_word if len(blank_word) > 3 else f"Concept {index + 1}"
             
-            if concept_name.lower() not in used_concepts:
-                sentence_with_blank = sentence.replace(blank_word, "______", 1)
+            if concept_name.casefold() not in used_concepts:
+                sentence_with_blank = sentence[:blank_offset] + "______" + sentence[blank_offset + len(blank_word):]
                 return {
                     'question': f"Fill in the blank: {sentence_with_blank}",
                     'answer': f"The missing word is: **{blank_word}**. Complete sentence: {sentence}",
@@ -298,7 +310,7 @@ def _create_flashcard_from_sentence(sentence: str, index: int, used_concepts: se
     # Strategy 4: Concept explanation for complex sentences
     if len(words) >= 12:
         concept_name = f"Concept {index + 1}"
-        if concept_name not in used_concepts:
+        if concept_name.casefold() not in used_concepts:
             return {
                 'question': f"Explain this key concept: {sentence[:60]}...",
                 'answer': sentence.strip(),
@@ -309,15 +321,16 @@ def _create_flashcard_from_sentence(sentence: str, index: int, used_concepts: se
     
     return None
 
-def _create_definition_card(sentence: str, index: int) -> Dict:
+def _create_definition_card(sentence: str, index: int, words: List[str] = None) -> Dict:
     """Create a definition-style card from any sentence"""
-    words = sentence.split()
+    if words is None:
+        words = sentence.split()
     if len(words) < 6:
         return None
         
     # Extract potential key terms (longer words, not common words)
     potential_terms = [
-        word.strip('.,!?;:"()[]') for word in words 
+        word.strip(_PUNCT_STR) for word in words 
         if len(word) > 5 and word.lower() not in [
             'because', 'however', 'therefore', 'through', 'without', 'between', 
             'during', 'before', 'after', 'within', 'around', 'should', 'could', 'would'
@@ -403,9 +416,5 @@ def _calculate_fallback_quality_score(flashcards: List[Dict]) -> float:
 
 def _get_strategies_used(flashcards: List[Dict]) -> List[str]:
     """Get list of strategies used in flashcard generation"""
-    strategies = []
-    for card in flashcards:
-        strategy = card.get('strategy', 'unknown')
-        if strategy not in strategies:
-            strategies.append(strategy)
-    return strategies
\ No newline at end of file
+    # dict preserves insertion order, giving an O(n) ordered dedup
+    return list(dict.fromkeys(card.get('strategy', 'unknown') for card in flashcards))
\ No newline at end of file
@@ -1,7 +1,8 @@
 import streamlit as st
 import os
 import logging
-from typing import Dict, Optional, Any
+from typing import Dict, Mapping, Optional, Any
+from types import MappingProxyType
 from datetime import datetime
 from PIL import Image
 import io
@@ -12,9 +13,49 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Content types for Azure processing, keyed by lowercase file extension
+_CONTENT_TYPES: Mapping[str, str] = MappingProxyType({
+    'pdf': 'application/pdf',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'txt': 'text/plain',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+})
+_OCTET_STREAM = 'application/octet-stream'
+
+_IMAGE_EXTENSIONS = frozenset({'jpg', 'jpeg', 'png'})
+_OCR_EXTENSIONS = _IMAGE_EXTENSIONS | {'pdf'}
+
+# (minimum pixel count, complexity, reading time), checked from largest to smallest
+_IMAGE_COMPLEXITY_TIERS = (
+    (2_000_000, "high", "2-4 minutes"),    # > 2MP
+    (500_000, "medium", "1-3 minutes"),    # > 0.5MP
+)
+_IMAGE_COMPLEXITY_DEFAULT = ("low", "1-2 minutes")
+
+# Session slot holding (file_id, processed result) so reruns skip reprocessing;
+# namespaced so it cannot collide with the app's own session keys
+_UPLOAD_CACHE_KEY = "_file_handler_upload_cache"
+
+class _BytesUpload:
+    """Minimal stand-in for Streamlit's UploadedFile when bytes arrive another way (e.g. the API)"""
+
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self.size = len(data)
+        self._data = data
+
+    def getvalue(self) -> bytes:
+        return self._data
+
 class FileHandler:
     """Enhanced file handler for managing file uploads and processing"""
 
+    def __init__(self):
+        # Precomputed once so extension checks are O(1) on every upload/rerun
+        self._supported_set = frozenset(ext.lower() for ext in Config.SUPPORTED_FILE_TYPES)
+
     def create_upload_interface(self) -> Optional[Dict[str, Any]]:
         """Enhanced file upload interface with better user guidance"""
         
@@ -29,29 +70,48 @@ class FileHandler:
         )
 
         if uploaded_file is not None:
-            return self._process_uploaded_file(uploaded_file)
+            # Streamlit reruns the script on every interaction; reuse the
+            # result for the same upload instead of re-parsing the file
+            cached = st.session_state.get(_UPLOAD_CACHE_KEY)
+            if cached and cached[0] == uploaded_file.file_id:
+                return dict(cached[1])
+
+            file_info = self._process_uploaded_file(uploaded_file)
+            st.session_state[_UPLOAD_CACHE_KEY] = (uploaded_file.file_id, file_info)
+            return dict(file_info)
 
         # Show helpful tips when no file is uploaded
         st.info("💡 **Tip:** For best results, upload clear documents with good text visibility")
         
         return None
 
+    def process_file_bytes(self, filename: str, file_bytes: bytes) -> Dict[str, Any]:
+        """Validate and extract metadata for raw upload bytes, same result shape as Streamlit uploads"""
+        return self._process_uploaded_file(_BytesUpload(filename, file_bytes))
+
     def _process_uploaded_file(self, uploaded_file) -> Dict[str, Any]:
         """Enhanced file processing with comprehensive metadata"""
         try:
+            # Read the upload and parse its extension once; every helper below reuses them
+            file_bytes = uploaded_file.getvalue()
+            extension = uploaded_file.name.rpartition('.')[2].lower()
+
+            # Parsed handles shared between validation and metadata extraction
+            parsed = {}
+
             # Validate file first
-            validation = self.validate_file(uploaded_file)
+            validation = self.validate_file(uploaded_file, file_bytes, extension, parsed)
             if not validation['valid']:
                 return {"error": validation['error']}
 
             # Extract comprehensive metadata
-            metadata = self._extract_enhanced_metadata(uploaded_file)
+            metadata = self._extract_enhanced_metadata(uploaded_file, file_bytes, extension, parsed)
             
             # Prepare file data for processing
             file_data = {
-                "file_bytes": uploaded_file.getvalue(),
-                "content_type": self._get_content_type(uploaded_file.name),
-                "needs_ocr": metadata["file_extension"] in ['pdf', 'jpg', 'jpeg', 'png']
+                "file_bytes": file_bytes,
+                "content_type": self._get_content_type(extension),
+                "needs_ocr": extension in _OCR_EXTENSIONS
             }
 
             logger.info(f"Processed file: {metadata['filename']} ({metadata['file_size_mb']:.2f}MB)")
@@ -66,10 +126,12 @@ class FileHandler:
             logger.error(f"File processing error: {e}")
             return {"error": f"File processing failed: {str(e)}"}
 
-    def _extract_enhanced_metadata(self, uploaded_file) -> Dict[str, Any]:
+    def _extract_enhanced_metadata(self, uploaded_file, file_bytes: bytes, file_extension: str,
+                                   parsed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Extract comprehensive metadata from uploaded file"""
+        if parsed is None:
+            parsed = {}
         
-        file_extension = uploaded_file.name.split('.')[-1].lower()
         file_size_mb = uploaded_file.size / (1024 * 1024)
         
         # Base metadata
@@ -88,13 +150,13 @@ class FileHandler:
         try:
             # File-specific metadata extraction
             if file_extension == 'pdf':
-                metadata.update(self._extract_pdf_metadata(uploaded_file))
-            elif file_extension in ['jpg', 'jpeg', 'png']:
-                metadata.update(self._extract_image_metadata(uploaded_file))
+                metadata.update(self._extract_pdf_metadata(file_bytes, parsed))
+            elif file_extension in _IMAGE_EXTENSIONS:
+                metadata.update(self._extract_image_metadata(file_bytes, parsed))
             elif file_extension == 'docx':
-                metadata.update(self._extract_docx_metadata(uploaded_file))
+                metadata.update(self._extract_docx_metadata(file_bytes, parsed))
             elif file_extension == 'txt':
-                metadata.update(self._extract_text_metadata(uploaded_file))
+                metadata.update(self._extract_text_metadata(file_bytes, parsed))
                 
         except Exception as e:
             logger.warning(f"Metadata extraction failed for {uploaded_file.name}: {e}")
@@ -102,10 +164,10 @@ class FileHandler:
             
         return metadata
     
-    def _extract_pdf_metadata(self, uploaded_file) -> Dict[str, Any]:
+    def _extract_pdf_metadata(self, file_bytes: bytes, parsed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Extract metadata from PDF files"""
         try:
-            pdf_reader = PdfReader(io.BytesIO(uploaded_file.getvalue()))
+            pdf_reader = self._get_pdf_reader(file_bytes, parsed)
             num_pages = len(pdf_reader.pages)
             
             # Estimate reading time (assuming 200 words per page, 200 WPM reading speed)
@@ -116,8 +178,9 @@ class FileHandler:
             preview_text = ""
             if num_pages > 0:
                 try:
-                    first_page = pdf_reader.pages[0]
-                    preview_text = first_page.extract_text()[:200] + "..." if first_page.extract_text() else ""
+                    # Text extraction is the expensive part, so run it only once
+                    first_page_text = pdf_reader.pages[0].extract_text()
+                    preview_text = first_page_text[:200] + "..." if first_page_text else ""
                 except:
                     preview_text = "Preview not available"
             
@@ -135,23 +198,47 @@ class FileHandler:
                 "processing_complexity": "medium"
             }
     
-    def _extract_image_metadata(self, uploaded_file) -> Dict[str, Any]:
+    def _get_parsed(self, parsed: Optional[Dict[str, Any]], key: str, loader):
+        """Return parsed[key], building it with loader() the first time it is needed"""
+        if parsed is None:
+            return loader()
+        if key not in parsed:
+            parsed[key] = loader()
+        return parsed[key]
+
+    def _get_image_size(self, file_bytes: bytes, parsed: Optional[Dict[str, Any]] = None):
+        """Read image dimensions once per upload, reusing them if already parsed"""
+        def load():
+            # Image.open only parses the header; .size never decodes pixel data
+            with Image.open(io.BytesIO(file_bytes)) as image:
+                return image.size
+
+        return self._get_parsed(parsed, 'image_size', load)
+
+    def _get_pdf_reader(self, file_bytes: bytes, parsed: Optional[Dict[str, Any]] = None) -> PdfReader:
+        """Build the PdfReader once per upload so the xref table is parsed a single time"""
+        return self._get_parsed(parsed, 'pdf', lambda: PdfReader(io.BytesIO(file_bytes)))
+
+    def _get_docx_document(self, file_bytes: bytes, parsed: Optional[Dict[str, Any]] = None):
+        """Load the Word document once per upload"""
+        return self._get_parsed(parsed, 'docx', lambda: docx.Document(io.BytesIO(file_bytes)))
+
+    def _get_text(self, file_bytes: bytes, parsed: Optional[Dict[str, Any]] = None) -> str:
+        """Decode a text upload once per upload"""
+        return self._get_parsed(parsed, 'text', lambda: file_bytes.decode('utf-8'))
+
+    def _extract_image_metadata(self, file_bytes: bytes, parsed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Extract metadata from image files"""
         try:
-            image = Image.open(io.BytesIO(uploaded_file.getvalue()))
-            width, height = image.size
+            width, height = self._get_image_size(file_bytes, parsed)
             
             # Estimate complexity based on image size
             total_pixels = width * height
-            if total_pixels > 2000000:  # > 2MP
-                complexity = "high"
-                reading_time = "2-4 minutes"
-            elif total_pixels > 500000:  # > 0.5MP
-                complexity = "medium" 
-                reading_time = "1-3 minutes"
+            for threshold, complexity, reading_time in _IMAGE_COMPLEXITY_TIERS:
+                if total_pixels > threshold:
+                    break
             else:
-                complexity = "low"
-                reading_time = "1-2 minutes"
+                complexity, reading_time = _IMAGE_COMPLEXITY_DEFAULT
             
             return {
                 "image_dimensions": f"{width} x {height}",
@@ -164,25 +251,28 @@ class FileHandler:
             logger.warning(f"Image metadata extraction failed: {e}")
             return {"processing_complexity": "medium"}
     
-    def _extract_docx_metadata(self, uploaded_file) -> Dict[str, Any]:
+    def _extract_docx_metadata(self, file_bytes: bytes, parsed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Extract metadata from Word documents"""
         try:
-            doc = docx.Document(io.BytesIO(uploaded_file.getvalue()))
+            doc = self._get_docx_document(file_bytes, parsed)
             
-            # Count paragraphs and estimate pages
-            paragraph_count = len([p for p in doc.paragraphs if p.text.strip()])
-            estimated_pages = max(1, paragraph_count // 15)  # Roughly 15 paragraphs per page
+            # Single pass over the paragraphs: count, word total and preview together
+            paragraph_count = 0
+            word_count = 0
+            preview_parts = []
+            for i, p in enumerate(doc.paragraphs):
+                text = p.text
+                if not text.strip():
+                    continue
+                paragraph_count += 1
+                word_count += len(text.split())
+                if i < 3:  # Preview comes from the first 3 paragraphs
+                    preview_parts.append(text[:100] + " ")
             
-            # Estimate reading time
-            total_text = " ".join([p.text for p in doc.paragraphs])
-            word_count = len(total_text.split())
+            estimated_pages = max(1, paragraph_count // 15)  # Roughly 15 paragraphs per page
             reading_time_minutes = max(1, word_count // 200)  # 200 WPM
             
-            # Get preview text
-            preview_text = ""
-            for p in doc.paragraphs[:3]:  # First 3 paragraphs
-                if p.text.strip():
-                    preview_text += p.text[:100] + " "
+            preview_text = "".join(preview_parts)
             preview_text = preview_text[:200] + "..." if len(preview_text) > 200 else preview_text
             
             return {
@@ -197,13 +287,14 @@ class FileHandler:
             logger.warning(f"DOCX metadata extraction failed: {e}")
             return {"processing_complexity": "medium"}
     
-    def _extract_text_metadata(self, uploaded_file) -> Dict[str, Any]:
+    def _extract_text_metadata(self, file_bytes: bytes, parsed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Extract metadata from text files"""
         try:
-            text_content = uploaded_file.getvalue().decode('utf-8')
+            text_content = self._get_text(file_bytes, parsed)
             
             word_count = len(text_content.split())
-            line_count = len(text_content.split('\n'))
+            # Count newlines on the raw bytes instead of building a list of lines
+            line_count = file_bytes.count(b'\n') + 1
             
             # Estimate pages (assuming 250 words per page)
             estimated_pages = max(1, word_count // 250)
@@ -232,9 +323,14 @@ class FileHandler:
             logger.warning(f"Text metadata extraction failed: {e}")
             return {"processing_complexity": "medium"}
 
-    def validate_file(self, uploaded_file) -> Dict[str, Any]:
+    def validate_file(self, uploaded_file, file_bytes: Optional[bytes] = None,
+                      extension: Optional[str] = None,
+                      parsed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Comprehensive file validation with helpful error messages"""
         try:
+            if file_bytes is None:
+                file_bytes = uploaded_file.getvalue()
+
             # Check file size first
             size_check = Config.validate_file_size(uploaded_file.size)
             if not size_check['valid']:
@@ -245,8 +341,9 @@ class FileHandler:
                 }
 
             # Check file extension
-            extension = uploaded_file.name.split('.')[-1].lower()
-            if not Config.validate_file_type(extension):
+            if extension is None:
+                extension = uploaded_file.name.rpartition('.')[2].lower()
+            if extension not in self._supported_set:
                 return {
                     'valid': False,
                     'error': f"Unsupported file type '.{extension}'",
@@ -254,7 +351,7 @@ class FileHandler:
                 }
 
             # Content validation based on file type
-            validation_result = self._validate_file_content(uploaded_file, extension)
+            validation_result = self._validate_file_content(file_bytes, extension, parsed)
             if not validation_result['valid']:
                 return validation_result
 
@@ -276,16 +373,15 @@ class FileHandler:
                 'suggestion': "Please try uploading a different file."
             }
     
-    def _validate_file_content(self, uploaded_file, extension: str) -> Dict[str, Any]:
+    def _validate_file_content(self, file_bytes: bytes, extension: str,
+                               parsed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Validate file content integrity"""
         try:
-            file_bytes = uploaded_file.getvalue()
-            
-            if extension in ['jpg', 'jpeg', 'png']:
+            if extension in _IMAGE_EXTENSIONS:
                 try:
-                    image = Image.open(io.BytesIO(file_bytes))
+                    width, height = self._get_image_size(file_bytes, parsed)
                     # Check if image is very small (might not have readable text)
-                    if image.size[0] < 100 or image.size[1] < 100:
+                    if width < 100 or height < 100:
                         return {
                             'valid': False,
                             'error': "Image resolution too low for text extraction",
@@ -300,7 +396,7 @@ class FileHandler:
             
             elif extension == 'pdf':
                 try:
-                    pdf_reader = PdfReader(io.BytesIO(file_bytes))
+                    pdf_reader = self._get_pdf_reader(file_bytes, parsed)
                     if len(pdf_reader.pages) == 0:
                         return {
                             'valid': False,
@@ -316,7 +412,7 @@ class FileHandler:
             
             elif extension == 'docx':
                 try:
-                    doc = docx.Document(io.BytesIO(file_bytes))
+                    doc = self._get_docx_document(file_bytes, parsed)
                     # Check if document has any text content
                     has_text = any(p.text.strip() for p in doc.paragraphs)
                     if not has_text:
@@ -334,7 +430,7 @@ class FileHandler:
             
             elif extension == 'txt':
                 try:
-                    text_content = file_bytes.decode('utf-8')
+                    text_content = self._get_text(file_bytes, parsed)
                     if len(text_content.strip()) < 10:
                         return {
                             'valid': False,
@@ -358,18 +454,9 @@ class FileHandler:
                 'suggestion': "Please try a different file."
             }
 
-    def _get_content_type(self, filename: str) -> str:
+    def _get_content_type(self, extension: str) -> str:
         """Get content type for Azure processing"""
-        extension = filename.split('.')[-1].lower()
-        content_types = {
-            'pdf': 'application/pdf',
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg',
-            'png': 'image/png',
-            'txt': 'text/plain',
-            'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        }
-        return content_types.get(extension, 'application/octet-stream')
+        return _CONTENT_TYPES.get(extension, _OCTET_STREAM)
 
 # Global Instance
 file_handler = FileHandler()
\ No newline at end of file
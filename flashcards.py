@@ -2,7 +2,10 @@ import logging
 import json
 import re
 import time
-from typing import Dict, List, Optional, Callable, Any
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Callable, Any
 from datetime import datetime
 from dataclasses import dataclass, field
 
@@ -14,26 +17,60 @@ from fallbacks import create_basic_flashcards
 
 logger = logging.getLogger(__name__)
 
+GEMINI_MODEL_NAME = "gemini-1.5-flash"
+
+# Response parsing patterns, compiled once rather than looked up on every parse
+_JSON_OPEN_RE = re.compile(r'[{\[]')
+_JSON_STRUCTURE_RE = re.compile(r'[{}\[\]"\\]')
+_CODE_BLOCK_RE = re.compile(r'```(?:json)?\s*(\{.*?\})\s*```', re.DOTALL)
+_QA_PATTERNS = tuple(re.compile(pattern, re.DOTALL | re.IGNORECASE) for pattern in (
+    r'(?:Q:|Question:|question:)\s*(.+?)(?:A:|Answer:|answer:)\s*(.+?)(?=(?:Q:|Question:|question:)|$)',
+    r'(?:\d+\.)\s*(.+?)\s*(?:Answer:|A:)\s*(.+?)(?=(?:\d+\.)|$)',
+    r'(?:Question\s*\d+:)\s*(.+?)(?:Answer\s*\d+:)\s*(.+?)(?=(?:Question\s*\d+:)|$)'
+))
+
+# Output token budget: per-card allowance plus JSON wrapper, capped at the model default
+MAX_OUTPUT_TOKENS = 4096
+OUTPUT_TOKENS_PER_CARD = 300
+OUTPUT_TOKENS_OVERHEAD = 200
+HEALTH_CHECK_MAX_OUTPUT_TOKENS = 16
+
+# Parsed flashcards kept per generator, keyed by a hash of model + prompt
+RESPONSE_CACHE_MAX_ENTRIES = 32
+
+def _clean_field(value: Any) -> str:
+    """Strip a card field, only coercing with str() when JSON gave a non-string"""
+    return value.strip() if isinstance(value, str) else str(value).strip()
+
 @dataclass
 class GeminiRateLimiter:
     """Simple rate limiter for Gemini API calls"""
     requests_per_minute: int = 60
-    request_timestamps: List[float] = field(default_factory=list)
+    request_timestamps: Deque[float] = field(default_factory=deque)
+    # Shared by concurrent API jobs, so the deque is only touched under this lock
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
     
     def can_make_request(self) -> bool:
-        now = time.time()
-        self.request_timestamps = [ts for ts in self.request_timestamps if now - ts < 60]
-        return len(self.request_timestamps) < self.requests_per_minute
+        with self._lock:
+            # Timestamps are appended in order, so expired ones are always at the left
+            now = time.monotonic()
+            while self.request_timestamps and now - self.request_timestamps[0] >= 60:
+                self.request_timestamps.popleft()
+            return len(self.request_timestamps) < self.requests_per_minute
     
     def record_request(self) -> None:
-        self.request_timestamps.append(time.time())
+        with self._lock:
+            self.request_timestamps.append(time.monotonic())
     
     def wait_if_needed(self) -> float:
         if self.can_make_request():
             return 0.0
         
-        if self.request_timestamps:
-            wait_time = 60 - (time.time() - self.request_timestamps[0]) + 1
+        with self._lock:
+            oldest = self.request_timestamps[0] if self.request_timestamps else None
+        
+        if oldest is not None:
+            wait_time = 60 - (time.monotonic() - oldest) + 1
             if wait_time > 0:
                 logger.info(f"Rate limit reached, waiting {wait_time:.1f} seconds")
                 time.sleep(wait_time)
@@ -48,6 +85,9 @@ class GeminiFlashcardGenerator:
         self.available = False
         self.rate_limiter = GeminiRateLimiter()
         self.initialization_error = None
+        self._response_cache: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        # API jobs share this instance across threadpool workers
+        self._cache_lock = threading.Lock()
         
         if Config.GEMINI_API_KEY:
             try:
@@ -57,7 +97,7 @@ class GeminiFlashcardGenerator:
                     "temperature": 0.7,
                     "top_p": 0.8,
                     "top_k": 40,
-                    "max_output_tokens": 4096,
+                    "max_output_tokens": MAX_OUTPUT_TOKENS,
                     "response_mime_type": "text/plain"
                 }
                 
@@ -69,12 +109,16 @@ class GeminiFlashcardGenerator:
                 }
                 
                 self.model = genai.GenerativeModel(
-                    model_name="gemini-1.5-flash",
+                    model_name=GEMINI_MODEL_NAME,
                     generation_config=generation_config,
                     safety_settings=safety_settings
                 )
                 
-                test_response = self.model.generate_content("Hello")
+                # The probe only needs to prove the key works, so keep its output tiny
+                test_response = self.model.generate_content(
+                    "Hello",
+                    generation_config={"max_output_tokens": HEALTH_CHECK_MAX_OUTPUT_TOKENS}
+                )
                 if test_response and test_response.text:
                     self.available = True
                     logger.info("Gemini AI initialized and tested successfully")
@@ -110,6 +154,14 @@ class GeminiFlashcardGenerator:
             
             prompt = self._create_flashcard_prompt(cleaned_text, generation_params)
             
+            cache_key = self._cache_key(prompt)
+            cached_flashcards = self._get_cached_flashcards(cache_key)
+            if cached_flashcards:
+                logger.info("Reusing cached Gemini flashcards for identical prompt")
+                if progress_callback:
+                    progress_callback("✅ Flashcards generated successfully!", 1.0)
+                return self._build_result(cached_flashcards, 0.0, False, cached=True)
+            
             wait_time = self.rate_limiter.wait_if_needed()
             if wait_time > 0 and progress_callback:
                 progress_callback(f"⏳ Waiting {wait_time:.1f}s for API rate limit...", 0.4)
@@ -117,11 +169,30 @@ class GeminiFlashcardGenerator:
             if progress_callback:
                 progress_callback("🤖 Generating flashcards with Gemini AI...", 0.5)
             
+            num_cards = generation_params.get('num_flashcards', Config.DEFAULT_FLASHCARD_COUNT)
+            token_budget = self._output_token_budget(num_cards)
             start_time = time.time()
             self.rate_limiter.record_request()
-            response = self.model.generate_content(prompt)
+            response = self.model.generate_content(
+                prompt,
+                generation_config={"max_output_tokens": token_budget}
+            )
+            
+            # A cut-off response never closes its JSON, so retry once with the full budget
+            if token_budget < MAX_OUTPUT_TOKENS and self._hit_token_limit(response):
+                logger.warning(f"Gemini output truncated at {token_budget} tokens, retrying with {MAX_OUTPUT_TOKENS}")
+                self.rate_limiter.wait_if_needed()
+                self.rate_limiter.record_request()
+                response = self.model.generate_content(
+                    prompt,
+                    generation_config={"max_output_tokens": MAX_OUTPUT_TOKENS}
+                )
             generation_time = time.time() - start_time
             
+            truncated = self._hit_token_limit(response)
+            if truncated:
+                logger.warning(f"Gemini output still truncated at {MAX_OUTPUT_TOKENS} tokens")
+            
             if not response or not response.text:
                 logger.warning("Empty response from Gemini")
                 return self._create_fallback_flashcards(text, generation_params)
@@ -132,44 +203,90 @@ class GeminiFlashcardGenerator:
             flashcards = self._parse_flashcard_response(response.text)
             
             if not flashcards:
-                logger.warning("No valid flashcards parsed, using fallback")
+                if truncated:
+                    logger.warning("No valid flashcards parsed from truncated Gemini output, using fallback")
+                else:
+                    logger.warning("No valid flashcards parsed, using fallback")
                 return self._create_fallback_flashcards(text, generation_params)
             
+            # Only complete, successful parses are cached, so fallbacks never get replayed
+            if not truncated:
+                self._store_cached_flashcards(cache_key, flashcards)
+            
             if progress_callback:
                 progress_callback("✅ Flashcards generated successfully!", 1.0)
             
-            return {
-                "flashcards": flashcards,
-                "generation_metadata": {
-                    "total_generated": len(flashcards),
-                    "method": "gemini_ai_enhanced",
-                    "generation_time_seconds": round(generation_time, 2),
-                    "quality_score": self._calculate_quality_score(flashcards),
-                    "timestamp": datetime.now().isoformat(),
-                    "rate_limited": wait_time > 0
-                },
-                "success": True
-            }
+            return self._build_result(flashcards, generation_time, wait_time > 0)
             
         except Exception as e:
             logger.error(f"Enhanced Gemini flashcard generation error: {e}")
             return self._create_fallback_flashcards(text, generation_params)
     
+    def _hit_token_limit(self, response) -> bool:
+        """True when Gemini stopped generating because it reached max_output_tokens"""
+        try:
+            finish_reason = response.candidates[0].finish_reason
+        except (AttributeError, IndexError, TypeError):
+            return False
+        return getattr(finish_reason, 'name', None) == 'MAX_TOKENS'
+    
+    def _output_token_budget(self, num_cards: int) -> int:
+        """Scale the output token cap with the number of cards requested"""
+        return min(MAX_OUTPUT_TOKENS, OUTPUT_TOKENS_OVERHEAD + OUTPUT_TOKENS_PER_CARD * max(int(num_cards), 1))
+    
+    def _build_result(self, flashcards: List[Dict], generation_time: float,
+                      rate_limited: bool, cached: bool = False) -> Dict:
+        """Wrap generated flashcards with generation metadata"""
+        return {
+            "flashcards": flashcards,
+            "generation_metadata": {
+                "total_generated": len(flashcards),
+                "method": "gemini_ai_enhanced",
+                "generation_time_seconds": round(generation_time, 2),
+                "quality_score": self._calculate_quality_score(flashcards),
+                "timestamp": datetime.now().isoformat(),
+                "rate_limited": rate_limited,
+                "cached": cached
+            },
+            "success": True
+        }
+    
+    def _cache_key(self, prompt: str) -> str:
+        """Exact-match key; the model name is included so a model change invalidates it"""
+        return hashlib.sha256(f"{GEMINI_MODEL_NAME}\n{prompt}".encode('utf-8')).hexdigest()
+    
+    def _get_cached_flashcards(self, cache_key: str) -> Optional[List[Dict]]:
+        """Return a copy of cached flashcards, marking the entry as recently used"""
+        with self._cache_lock:
+            flashcards = self._response_cache.get(cache_key)
+            if flashcards is None:
+                return None
+            self._response_cache.move_to_end(cache_key)
+        return [dict(card) for card in flashcards]
+    
+    def _store_cached_flashcards(self, cache_key: str, flashcards: List[Dict]) -> None:
+        """Store flashcards, evicting the least recently used entry when full"""
+        entry = [dict(card) for card in flashcards]
+        with self._cache_lock:
+            self._response_cache[cache_key] = entry
+            self._response_cache.move_to_end(cache_key)
+            if len(self._response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+                self._response_cache.popitem(last=False)
+    
     def _clean_text_for_processing(self, text: str) -> str:
         """Clean and limit text for Gemini processing"""
-        cleaned = re.sub(r'\s+', ' ', text)
-        cleaned = re.sub(r'\n\s*\n', '\n\n', cleaned)
-        cleaned = cleaned.strip()
+        # A single split both collapses whitespace and yields the word list for truncation
+        words = text.split()
         
         max_words = Config.ProcessingLimits.FLASHCARD_INPUT_MAX_WORDS
-        words = cleaned.split()
         if len(words) > max_words:
-            first_part = words[:int(max_words * 0.7)]
-            last_part = words[-int(max_words * 0.3):]
-            cleaned = ' '.join(first_part + ['...'] + last_part)
-            logger.info(f"Text truncated from {len(words)} to {len(cleaned.split())} words")
+            head_count = int(max_words * 0.7)
+            tail_count = int(max_words * 0.3)
+            cleaned = ' '.join(words[:head_count]) + ' ... ' + ' '.join(words[-tail_count:])
+            logger.info(f"Text truncated from {len(words)} to {head_count + 1 + tail_count} words")
+            return cleaned
         
-        return cleaned
+        return ' '.join(words)
     
     def _create_flashcard_prompt(self, text: str, params: Dict) -> str:
         """Create effective prompt for Gemini AI"""
@@ -225,21 +342,17 @@ Generate exactly {num_cards} flashcards now:
     def _parse_flashcard_response(self, response_text: str) -> List[Dict]:
         """Enhanced JSON parsing with multiple fallback strategies"""
         
-        flashcards = self._parse_json_strategy(response_text)
-        if flashcards:
-            return flashcards
-        
-        flashcards = self._parse_code_block_strategy(response_text)
-        if flashcards:
-            return flashcards
-        
-        flashcards = self._parse_qa_pattern_strategy(response_text)
-        if flashcards:
-            return flashcards
-        
-        flashcards = self._parse_line_strategy(response_text)
-        if flashcards:
-            return flashcards
+        # Strategies run cheapest and most precise first; the first non-empty result wins
+        strategies = (
+            self._parse_json_strategy,
+            self._parse_code_block_strategy,
+            self._parse_qa_pattern_strategy,
+            self._parse_line_strategy
+        )
+        for strategy in strategies:
+            flashcards = strategy(response_text)
+            if flashcards:
+                return flashcards
         
         logger.warning("All parsing strategies failed")
         return []
@@ -247,44 +360,81 @@ Generate exactly {num_cards} flashcards now:
     def _parse_json_strategy(self, response_text: str) -> List[Dict]:
         """Strategy 1: Clean JSON parsing"""
         try:
-            cleaned_response = response_text.strip()
-            
-            if '```json' in cleaned_response:
-                cleaned_response = re.sub(r'```json\s*', '', cleaned_response)
-                cleaned_response = re.sub(r'```\s*$', '', cleaned_response)
-            elif '```' in cleaned_response:
-                cleaned_response = re.sub(r'```\s*', '', cleaned_response)
-            
-            json_start = cleaned_response.find('{')
-            if json_start > 0:
-                cleaned_response = cleaned_response[json_start:]
-            
-            json_end = cleaned_response.rfind('}')
-            if json_end > 0:
-                cleaned_response = cleaned_response[:json_end + 1]
-            
-            parsed_data = json.loads(cleaned_response)
-            
-            if isinstance(parsed_data, dict):
-                flashcards = parsed_data.get('flashcards', [])
-            elif isinstance(parsed_data, list):
-                flashcards = parsed_data
-            else:
-                return []
-            
-            return self._validate_flashcards(flashcards)
+            # Prose may contain brackets before the JSON (e.g. "[5] flashcards"),
+            # so fall through to the next candidate until one yields valid cards
+            for json_block in self._iter_json_blocks(response_text):
+                try:
+                    parsed_data = json.loads(json_block)
+                except json.JSONDecodeError as e:
+                    logger.debug(f"JSON candidate rejected: {e}")
+                    continue
+                
+                if isinstance(parsed_data, dict):
+                    flashcards = parsed_data.get('flashcards', [])
+                elif isinstance(parsed_data, list):
+                    flashcards = parsed_data
+                else:
+                    continue
+                
+                if not isinstance(flashcards, list):
+                    continue
+                
+                validated = self._validate_flashcards(flashcards)
+                if validated:
+                    return validated
             
-        except json.JSONDecodeError as e:
-            logger.debug(f"JSON strategy failed: {e}")
             return []
+            
         except Exception as e:
             logger.debug(f"JSON strategy error: {e}")
             return []
     
+    def _iter_json_blocks(self, response_text: str):
+        """Yield balanced JSON object/array candidates left to right in one linear pass"""
+        search_from = 0
+        while True:
+            opening = _JSON_OPEN_RE.search(response_text, search_from)
+            if opening is None:
+                return
+            start = opening.start()
+            end = self._find_json_end(response_text, start)
+            if end is None:
+                # The scan already ran to the end of the text without closing this block
+                return
+            yield response_text[start:end + 1]
+            # A rejected block is skipped whole, so its nested openers are never rescanned
+            search_from = end + 1
+    
+    def _find_json_end(self, response_text: str, start: int) -> Optional[int]:
+        """Return the index closing the JSON object/array opening at start, or None if it never closes"""
+        # Only structural characters are visited; the regex skips everything else in C
+        depth = 0
+        in_string = False
+        escaped_pos = -1
+        for match in _JSON_STRUCTURE_RE.finditer(response_text, start):
+            pos = match.start()
+            if pos == escaped_pos:
+                continue
+            char = match.group()
+            if char == '\\':
+                escaped_pos = pos + 1
+            elif char == '"':
+                in_string = not in_string
+            elif in_string:
+                continue
+            elif char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return pos
+        
+        return None
+    
     def _parse_code_block_strategy(self, response_text: str) -> List[Dict]:
         """Strategy 2: Extract from any code block"""
         try:
-            code_blocks = re.findall(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
+            code_blocks = _CODE_BLOCK_RE.findall(response_text)
             
             for block in code_blocks:
                 try:
@@ -308,14 +458,8 @@ Generate exactly {num_cards} flashcards now:
         try:
             flashcards = []
             
-            patterns = [
-                r'(?:Q:|Question:|question:)\s*(.+?)(?:A:|Answer:|answer:)\s*(.+?)(?=(?:Q:|Question:|question:)|$)',
-                r'(?:\d+\.)\s*(.+?)\s*(?:Answer:|A:)\s*(.+?)(?=(?:\d+\.)|$)',
-                r'(?:Question\s*\d+:)\s*(.+?)(?:Answer\s*\d+:)\s*(.+?)(?=(?:Question\s*\d+:)|$)'
-            ]
-            
-            for pattern in patterns:
-                matches = re.findall(pattern, response_text, re.DOTALL | re.IGNORECASE)
+            for pattern in _QA_PATTERNS:
+                matches = pattern.findall(response_text)
                 
                 for i, (question, answer) in enumerate(matches):
                     question = question.strip().replace('\n', ' ')
@@ -386,18 +530,20 @@ Generate exactly {num_cards} flashcards now:
             if 'question' not in card or 'answer' not in card:
                 continue
             
-            cleaned_card = {
-                'question': str(card.get('question', '')).strip(),
-                'answer': str(card.get('answer', '')).strip(),
-                'concept': str(card.get('concept', 'General')).strip(),
-                'difficulty': str(card.get('difficulty', 'intermediate')).strip().lower()
-            }
+            # Length checks run first so rejected cards never build the other fields
+            question = _clean_field(card['question'])
+            if not 10 < len(question) < 300:
+                continue
+            answer = _clean_field(card['answer'])
+            if not 10 < len(answer) < 500:
+                continue
             
-            if (len(cleaned_card['question']) > 10 and 
-                len(cleaned_card['answer']) > 10 and
-                len(cleaned_card['question']) < 300 and
-                len(cleaned_card['answer']) < 500):
-                valid_flashcards.append(cleaned_card)
+            valid_flashcards.append({
+                'question': question,
+                'answer': answer,
+                'concept': _clean_field(card.get('concept', 'General')),
+                'difficulty': _clean_field(card.get('difficulty', 'intermediate')).lower()
+            })
         
         logger.info(f"Validated {len(valid_flashcards)} flashcards")
         return valid_flashcards
@@ -221,7 +221,6 @@ class StreamlitProgressReporter:
     def report(self, message: str, progress: float) -> None:
         self.status_text.text(message)
         self.progress_bar.progress(min(progress, 1.0))
-        time.sleep(0.1)
     
     def clear(self) -> None:
         self.progress_bar.empty()